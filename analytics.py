@@ -0,0 +1,112 @@
+import heapq
+
+from utils import (OPTICS_RX_POWER, STATS_RX_BYTES, STATS_TX_BYTES,
+                   STATUS_OPTICS, STATUS_PORT, STATUS_STATS, onu_online,
+                   to_number)
+
+# Columns of summary_rows(), ready for table.Table
+SUMMARY_COLUMNS = ['host', 'port', 'onus', 'online', 'online_ratio',
+                   'rx_bytes', 'tx_bytes', 'worst_rx_power', 'worst_rx_serial']
+
+
+class PortStats():
+    '''
+    Running totals for one PON port
+    '''
+    __slots__ = ['port', 'onus', 'online', 'rx_bytes', 'tx_bytes',
+                 'worst_rx_power', 'worst_rx_serial', 'top', 'top_size']
+
+    def add(self, serial_number, onu):
+        self.onus += 1
+        if onu_online(onu):
+            self.online += 1
+        stats = onu.get(STATUS_STATS) or {}
+        rx_bytes = to_number(stats.get(STATS_RX_BYTES)) or 0
+        tx_bytes = to_number(stats.get(STATS_TX_BYTES)) or 0
+        self.rx_bytes += rx_bytes
+        self.tx_bytes += tx_bytes
+        rx_power = to_number((onu.get(STATUS_OPTICS) or {}).get(OPTICS_RX_POWER))
+        if rx_power is not None and (self.worst_rx_power is None or rx_power < self.worst_rx_power):
+            self.worst_rx_power = rx_power
+            self.worst_rx_serial = serial_number
+        # Min heap keeps the N heaviest subscribers
+        if self.top_size:
+            item = (rx_bytes + tx_bytes, serial_number)
+            if len(self.top) < self.top_size:
+                heapq.heappush(self.top, item)
+            elif item > self.top[0]:
+                heapq.heapreplace(self.top, item)
+
+    def as_dict(self):
+        return {
+            'port': self.port,
+            'onus': self.onus,
+            'online': self.online,
+            'online_ratio': round(self.online / self.onus, 4) if self.onus else 0,
+            'rx_bytes': int(self.rx_bytes),
+            'tx_bytes': int(self.tx_bytes),
+            'worst_rx_power': self.worst_rx_power,
+            'worst_rx_serial': self.worst_rx_serial,
+            'top': [(serial_number, int(traffic))
+                    for traffic, serial_number in sorted(self.top, reverse=True)],
+        }
+
+    def __init__(self, port, top_size=5):
+        self.port = port
+        self.onus = 0
+        self.online = 0
+        self.rx_bytes = 0
+        self.tx_bytes = 0
+        self.worst_rx_power = None
+        self.worst_rx_serial = None
+        self.top = []
+        self.top_size = top_size
+        super().__init__()
+
+
+def port_summary(status, top=5):
+    '''
+    Per PON port aggregates from get_bulk_onu_status() output, in one pass.
+    Returns {port: dict}, top holds the N heaviest (serial, bytes) on the port
+    '''
+    ports = {}
+    for serial_number, onu in status.items():
+        port = onu.get(STATUS_PORT)
+        stats = ports.get(port)
+        if stats is None:
+            stats = ports[port] = PortStats(port, top)
+        stats.add(serial_number, onu)
+    return {port: stats.as_dict() for port, stats in ports.items()}
+
+
+def fleet_summary(snapshots, top=5):
+    '''
+    port_summary() for {host: status} snapshots.
+    Returns ({host: {port: dict}}, fleet wide top N as (bytes, host, serial))
+    '''
+    summaries = {}
+    heaviest = []
+    for host, status in snapshots.items():
+        summaries[host] = port_summary(status, top)
+        for port in summaries[host].values():
+            for serial_number, traffic in port['top']:
+                item = (traffic, host, serial_number)
+                if len(heaviest) < top:
+                    heapq.heappush(heaviest, item)
+                elif item > heaviest[0]:
+                    heapq.heapreplace(heaviest, item)
+    return summaries, sorted(heaviest, reverse=True)
+
+
+def summary_rows(summaries):
+    '''
+    Flattens {host: {port: dict}} into rows for table.Table(SUMMARY_COLUMNS)
+    '''
+    rows = []
+    for host, ports in summaries.items():
+        for port in sorted(ports, key=str):
+            row = dict(ports[port])
+            row['host'] = host
+            row.pop('top')
+            rows.append(row)
+    return rows
@@ -0,0 +1,174 @@
+import json
+import struct
+import time
+import zlib
+
+from history import SECTIONS
+
+MAGIC = b'UFBK'
+VERSION = 1
+# Trailer: index offset, index length, magic
+TRAILER = struct.Struct('<QI4s')
+
+
+def _compact(data):
+    return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+
+class _BlockWriter():
+    '''
+    Groups entries in zlib blocks. Small entries compress badly on their own,
+    a block is still small enough to decode for a single entry
+    '''
+
+    def add(self, data):
+        '''
+        Adds an entry, returns its [block, offset, length] address
+        '''
+        raw = _compact(data)
+        address = [len(self.blocks), self.size, len(raw)]
+        self.pending.append(raw)
+        self.size += len(raw)
+        self.count += 1
+        if self.count >= self.block_size:
+            self.flush()
+        return address
+
+    def flush(self):
+        if not self.pending:
+            return
+        compressed = zlib.compress(b''.join(self.pending), 9)
+        self.blocks.append([self.f.tell(), len(compressed)])
+        self.f.write(compressed)
+        self.pending = []
+        self.size = 0
+        self.count = 0
+
+    def __init__(self, f, block_size):
+        self.f = f
+        self.block_size = block_size
+        self.blocks = []
+        self.pending = []
+        self.size = 0
+        self.count = 0
+        super().__init__()
+
+
+def write_backup(path, configurations, block_size=64):
+    '''
+    Writes {host: get_configuration()} to a compact backup file.
+    ONUs and profiles are indexed one by one, the rest of the
+    configuration is stored as one entry per host
+    '''
+    index = {'version': VERSION, 'created': time.time(), 'hosts': {}}
+    with open(path, 'wb') as f:
+        f.write(MAGIC + bytes([VERSION]))
+        writer = _BlockWriter(f, block_size)
+        for host, configuration in configurations.items():
+            host_index = {}
+            rest = dict(configuration)
+            for section in SECTIONS:
+                entries = rest.pop(section, {})
+                host_index[section] = {key: writer.add(value)
+                                       for key, value in entries.items()}
+            host_index['other'] = writer.add(rest)
+            index['hosts'][host] = host_index
+        writer.flush()
+        index['blocks'] = writer.blocks
+        raw_index = zlib.compress(_compact(index), 9)
+        index_offset = f.tell()
+        f.write(raw_index)
+        f.write(TRAILER.pack(index_offset, len(raw_index), MAGIC))
+
+
+def backup_fleet(path, clients, block_size=64):
+    '''
+    Backs up configuration of every OLTClient in clients
+    '''
+    write_backup(path, {client.host: client.get_configuration()
+                        for client in clients}, block_size)
+
+
+class Backup():
+    '''
+    Reads backups written by write_backup(). Only the index is loaded on
+    open, entries are decoded from their block when asked for
+    '''
+
+    def hosts(self):
+        return list(self.index['hosts'])
+
+    def onus(self, host):
+        return list(self.index['hosts'][host]['onu-list'])
+
+    def profiles(self, host):
+        return list(self.index['hosts'][host]['onu-profiles'])
+
+    def get_onu(self, host, serial_number):
+        return self._read(self.index['hosts'][host]['onu-list'][serial_number])
+
+    def get_profile(self, host, profile_id):
+        return self._read(self.index['hosts'][host]['onu-profiles'][profile_id])
+
+    def section(self, host, section):
+        '''
+        Returns {key: value} for a whole section of a host
+        '''
+        return {key: self._read(address)
+                for key, address in self.index['hosts'][host][section].items()}
+
+    def load(self, host):
+        '''
+        Rebuilds full configuration of a host
+        '''
+        configuration = self._read(self.index['hosts'][host]['other'])
+        for section in SECTIONS:
+            configuration[section] = self.section(host, section)
+        return configuration
+
+    def restore(self, olt_client, host=None, chunk_size=200, attempts=3):
+        '''
+        Pushes profiles first, then ONUs, of host (defaults to the client's
+        host) with batched commits. Returns BatchResults for profiles and ONUs
+        '''
+        host = host or olt_client.host
+        results = []
+        for section in ('onu-profiles', 'onu-list'):
+            results.append(olt_client.set_entries(
+                section, self.section(host, section),
+                attempts=attempts, chunk_size=chunk_size))
+        return results
+
+    def _read(self, address):
+        block, offset, length = address
+        if block != self._block_id:
+            block_offset, block_length = self.index['blocks'][block]
+            self.f.seek(block_offset)
+            self._block = zlib.decompress(self.f.read(block_length))
+            self._block_id = block
+        return json.loads(self._block[offset:offset + length])
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __init__(self, path):
+        self.f = open(path, 'rb')
+        header = self.f.read(len(MAGIC) + 1)
+        assert header[:len(MAGIC)] == MAGIC, f'{path} is not a backup file'
+        assert header[len(MAGIC)] == VERSION, f'Unsupported backup version {header[len(MAGIC)]}'
+        self.f.seek(-TRAILER.size, 2)
+        index_offset, index_length, magic = TRAILER.unpack(
+            self.f.read(TRAILER.size))
+        assert magic == MAGIC, f'{path} is truncated'
+        self.f.seek(index_offset)
+        self.index = json.loads(zlib.decompress(self.f.read(index_length)))
+        # Last decoded block, entries are usually read in order
+        self._block_id = None
+        self._block = b''
+        super().__init__()
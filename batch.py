@@ -0,0 +1,175 @@
+import requests
+
+
+class BatchResult():
+    '''
+    Per entry outcome of batch.json commits.
+    succeeded is a list of keys, failed maps key -> error message
+    '''
+
+    @property
+    def ok(self):
+        return not self.failed
+
+    def merge(self, other):
+        self.succeeded.extend(other.succeeded)
+        self.failed.update(other.failed)
+        self.requests += other.requests
+        return self
+
+    def __repr__(self):
+        return f'<BatchResult {self.section} ok={len(self.succeeded)} failed={len(self.failed)}>'
+
+    def __init__(self, action, section):
+        self.action = action
+        self.section = section
+        self.succeeded = []
+        self.failed = {}
+        self.requests = 0
+        super().__init__()
+
+
+def _is_failure(block):
+    '''
+    batch.json blocks report success/failure as '1'/'0' strings
+    '''
+    if not isinstance(block, dict):
+        return False
+    if str(block.get('failure', '0')) not in ('0', 'false', 'False'):
+        return True
+    if str(block.get('success', '1')) in ('0', 'false', 'False'):
+        return True
+    return bool(block.get('error'))
+
+
+def _errors(error, path=()):
+    '''
+    Flattens error blocks to (path words, message). Errors come either as
+    {"onu-list UBNTxxx name": "message"} or as nested dicts
+    '''
+    if isinstance(error, dict):
+        for key, value in error.items():
+            yield from _errors(value, path + tuple(str(key).split()))
+    else:
+        yield path, str(error)
+
+
+def _merge_errors(first, second):
+    if isinstance(first, dict) and isinstance(second, dict):
+        merged = dict(first)
+        for key, value in second.items():
+            merged[key] = _merge_errors(merged[key], value) if key in merged else value
+        return merged
+    if not first or first == second:
+        return second
+    if not second:
+        return first
+    return f'{first}; {second}'
+
+
+def merge_batch_replies(replies):
+    '''
+    Merges batch.json replies of a split payload into one. A block fails if
+    any part failed, and error blocks of every part are kept
+    '''
+    reply = {}
+    for part in replies:
+        for key, value in part.items():
+            if key not in reply:
+                reply[key] = value
+                continue
+            merged = reply[key]
+            if not isinstance(merged, dict) or not isinstance(value, dict):
+                if _is_failure(value):
+                    reply[key] = value
+                continue
+            merged = dict(merged)
+            if _is_failure(merged) or _is_failure(value):
+                merged['failure'] = '1'
+                merged['success'] = '0'
+            if value.get('error'):
+                merged['error'] = _merge_errors(merged.get('error'), value['error'])
+            reply[key] = merged
+    return reply
+
+
+def parse_batch_response(action, section, keys, response):
+    '''
+    Splits a full batch.json response into per entry results.
+    Returns (BatchResult, keys with unknown outcome, error message)
+    Unknown keys are entries that were not applied but no error points to them
+    '''
+    result = BatchResult(action, section)
+    block = response.get(action, {})
+    keys = list(keys)
+    if not _is_failure(block) and not _is_failure(response.get('COMMIT')):
+        result.succeeded.extend(keys)
+        return result, [], None
+
+    lookup = set(keys)
+    messages = []
+    for source in (block, response.get('COMMIT')):
+        if isinstance(source, dict) and source.get('error'):
+            for path, message in _errors(source['error']):
+                messages.append(message)
+                for word in path:
+                    if word in lookup:
+                        result.failed[word] = message
+                        break
+    # Failed commits apply nothing, the rest has to be sent again
+    unknown = [key for key in keys if key not in result.failed]
+    return result, unknown, '; '.join(messages) or 'Batch failed'
+
+
+def commit_entries(olt_client, section, entries, action='SET',
+                   attempts=3, chunk_size=100):
+    '''
+    Commits {key: value} entries of a section (onu-list, onu-profiles) in
+    chunks. Only failed entries are retried, up to attempts times each.
+    When a chunk fails without saying which entry, it is split in halves
+    until the bad entry is isolated. Returns a BatchResult
+    '''
+    result = BatchResult(action, section)
+    keys = list(entries)
+    queue = [(keys[start:start + chunk_size], 1)
+             for start in range(0, len(keys), chunk_size)]
+    while queue:
+        chunk, attempt = queue.pop(0)
+        data = {action: {section: {key: entries[key] for key in chunk}}}
+        try:
+            response = olt_client.post_batch(data)
+        except (ConnectionError, requests.RequestException) as ex:
+            # Transport error, says nothing about the entries: resend the chunk
+            result.requests += 1
+            if attempt < attempts:
+                queue.append((chunk, attempt + 1))
+            else:
+                error = str(ex) or 'Connection error'
+                result.failed.update({key: error for key in chunk})
+            continue
+        chunk_result, unknown, error = parse_batch_response(
+            action, section, chunk, response)
+        chunk_result.requests = 1
+        failed = chunk_result.failed
+        chunk_result.failed = {}
+        result.merge(chunk_result)
+
+        if failed and unknown:
+            # Known bad entries were found, the others just weren't applied
+            queue.insert(0, (unknown, attempt))
+        elif len(unknown) > 1:
+            # No hint of the bad entry, bisect
+            half = len(unknown) // 2
+            queue[0:0] = [(unknown[:half], attempt), (unknown[half:], attempt)]
+        elif unknown:
+            failed[unknown[0]] = error
+
+        retry = []
+        for key, message in failed.items():
+            if attempt < attempts:
+                retry.append(key)
+            else:
+                result.failed[key] = message
+        if retry:
+            queue.append((retry, attempt + 1))
+    return result
@@ -1,25 +1,86 @@
 import cmd
 import getpass
+import io
+import sys
 from olt import OLTClient, LoginError
 from onu import ONU, ONUWiFi
 from onu_profile import ONUProfile
+from table import Table
+from utils import STATUS_PORT, normalize_serial, onu_online
 
 
 def console(data, header=None):
     '''
     Helper function to print key/value pairs in 2 columns
     '''
+    out = io.StringIO()
     if header:
-        print(f'\n{header}')
+        out.write(f'\n{header}\n')
     for key, value in data.items():
-        s = "{:<30} {}".format(key, value)
-        print(s)
+        out.write("{:<30} {}\n".format(key, value))
+    sys.stdout.write(out.getvalue())
+
+
+def without(data, *keys):
+    '''
+    Copy of data dict without keys
+    '''
+    return {key: value for key, value in data.items() if key not in keys}
+
+
+def parse_listing(args):
+    '''
+    Parses listing options: columns A,B sort [-]COL where COL=VALUE page
+    '''
+    options = {'columns': None, 'sort': None, 'where': [], 'page': False}
+    args = list(args)
+    while args:
+        word = args.pop(0)
+        if word == 'page':
+            options['page'] = True
+        elif word in ('columns', 'sort', 'where') and args:
+            value = args.pop(0)
+            if word == 'where':
+                column, _, match = value.partition('=')
+                options['where'].append((column, match))
+            else:
+                options[word] = value
+        else:
+            raise ValueError(f'Invalid option {word}')
+    return options
+
+
+def apply_listing(table, options):
+    '''
+    Applies listing options to table
+    '''
+    if options['columns']:
+        table.select(options['columns'])
+    for column, match in options['where']:
+        table.where(column, match)
+    if options['sort']:
+        table.sort(options['sort'].lstrip('-'),
+                   reverse=options['sort'].startswith('-'))
+    return table
+
+
+def list_table(table, options):
+    '''
+    Applies listing options to table and prints it
+    '''
+    apply_listing(table, options).show(pager=options['page'])
 
 
 class UFiberCLI(cmd.Cmd):
     intro = 'UFiber Client for fw version 3.1.3'
     prompt = 'UFiber> '
 
+    ONU_COLUMNS = ['serial', 'name', 'profile', 'disable', 'online', 'port']
+    # Status columns need gpon_onu_list too, they are shown when asked for
+    ONU_STATUS_COLUMNS = ['online', 'port']
+    ONU_DEFAULT_COLUMNS = ['serial', 'name', 'profile', 'disable']
+    PROFILE_COLUMNS = ['profile', 'name', 'mode', 'down', 'up']
+
     def do_connect(self, host):
         '''
         Opens a new OLT connection
@@ -49,11 +110,19 @@ class UFiberCLI(cmd.Cmd):
     def do_show(self, arg):
         '''
         show configuration                  Shows OLT configuration
-        show onus                           Shows OLT configured ONUs
+        show onus [OPTIONS]                 Shows OLT configured ONUs
         show onu SERIALNUMBER config        Shows ONU configuration
         show onu SERIALNUMBER status        Shows ONU status
-        show profiles                       Shows OLT GPON profiles list
+        show profiles [OPTIONS]             Shows OLT GPON profiles list
+        show profiles detail                Shows OLT GPON profiles configuration
         show profile PROFILE-ID             Shows OLT GPON Profile configuration
+
+        Listing OPTIONS:
+        columns COL,COL                     Shows only these columns
+                                            (onus: online,port fetch status too)
+        sort [-]COL                         Sorts by column, - for descending
+        where COL=VALUE                     Filters rows, can be repeated
+        page                                Uses the pager
         '''
         try:
             assert(self.client)
@@ -74,14 +143,45 @@ class UFiberCLI(cmd.Cmd):
             print(configuration)
             return False
 
-        if arg == 'onus':
+        if arg.split(' ')[0] == 'onus':
+            try:
+                options = parse_listing(arg.split()[1:])
+            except ValueError as ex:
+                print(ex)
+                return False
+            table = Table(self.ONU_COLUMNS, visible=self.ONU_DEFAULT_COLUMNS)
+            try:
+                apply_listing(table, options)
+            except AssertionError as ex:
+                print(ex)
+                return False
+            # Status is only fetched if a status column is shown or used
+            used = set(table.visible)
+            used.add(table.sort_key)
+            used.update(column for column, _ in table.filters)
+            status = {}
+            if used & set(self.ONU_STATUS_COLUMNS):
+                status = self.client.get_bulk_onu_status() or {}
             configuration = self.client.get_configuration()
-            onus = configuration['onu-list']
-            for key, value in onus.items():
-                onu_brief = {
-                    key: value['name']
-                }
-                console(onu_brief)
+
+            def rows():
+                for serial_number, onu in configuration['onu-list'].items():
+                    onu_status = status.get(serial_number)
+                    yield {
+                        'serial': serial_number,
+                        'name': onu.get('name'),
+                        'profile': onu.get('profile'),
+                        'disable': onu.get('disable'),
+                        'online': onu_online(onu_status) if onu_status else None,
+                        'port': onu_status.get(STATUS_PORT) if onu_status else None,
+                    }
+
+            if options['sort'] or options['page']:
+                table.extend(rows())
+                table.show(pager=options['page'])
+            else:
+                # Nothing to sort, print rows as they are parsed
+                table.stream(rows())
             return False
 
         if arg.split(' ')[0] == 'onu':
@@ -90,65 +190,62 @@ class UFiberCLI(cmd.Cmd):
                 return False
 
             # Proper case for serial number
-            serial_number = str(arg.split(' ')[1]).strip()
-            serial_number = serial_number[:4].upper()+serial_number[4:].lower()
+            serial_number = normalize_serial(arg.split(' ')[1])
 
             action = str(arg.split(' ')[2]).strip()
 
             if action == 'config':
                 configuration = self.client.get_configuration()
                 onu = configuration['onu-list'][serial_number]
-                wifi = onu.pop('wifi')
-                console(onu, 'ONU CONFIGURATION')
-                console(wifi, 'WIFI CONFIGURATION')
+                console(without(onu, 'wifi'), 'ONU CONFIGURATION')
+                console(onu['wifi'], 'WIFI CONFIGURATION')
                 return False
 
             if action == 'status':
                 onu = self.client.get_onu_status(serial_number)
-                optics = onu.pop('optics')
-                stats = onu.pop('stats')
-                console(onu, 'ONU CONFIGURATION')
-                console(optics, 'ONU OPTICS')
-                console(stats, 'ONU TRAFFIC STATS')
+                console(without(onu, 'optics', 'stats'), 'ONU CONFIGURATION')
+                console(onu['optics'], 'ONU OPTICS')
+                console(onu['stats'], 'ONU TRAFFIC STATS')
                 return False
 
-        if arg == 'profiles':
-
+        if arg.split(' ')[0] == 'profiles' and 'detail' not in arg.split():
+            try:
+                options = parse_listing(arg.split()[1:])
+            except ValueError as ex:
+                print(ex)
+                return False
             profiles = self.client.get_onu_profiles()
-
-            for profile_key in profiles:
-
-                profile = profiles[profile_key]
-                profile_brief = {
-                    'name': profile['name'],
-                }
-
-                console(profile_brief, profile_key)
-
+            table = Table(self.PROFILE_COLUMNS)
+            for profile_key, profile in profiles.items():
+                table.add({
+                    'profile': profile_key,
+                    'name': profile.get('name'),
+                    'mode': profile.get('mode'),
+                    'down': profile.get('bandwidth-limit-down'),
+                    'up': profile.get('bandwidth-limit-up'),
+                })
+            try:
+                list_table(table, options)
+            except AssertionError as ex:
+                print(ex)
             return False
 
         if arg == 'profiles detail':
 
             profiles = self.client.get_onu_profiles()
 
-            for profile_key in profiles:
-
-                profile = profiles[profile_key]
+            for profile_key, profile in profiles.items():
 
-                router_mode = profile.pop('router-mode')
-                bridge_mode = profile.pop('bridge-mode')
                 if profile['mode'] == ONUProfile.MODE_ROUTER:
-                    mode = router_mode
+                    mode = profile['router-mode']
                 if profile['mode'] == ONUProfile.MODE_BRIDGE:
-                    mode = bridge_mode
-
-                services = profile.pop('services')
-                port = profile.pop('port')
+                    mode = profile['bridge-mode']
 
-                console(profile, f'GPON PROFILE {profile_key}')
+                console(without(profile, 'router-mode', 'bridge-mode', 'services', 'port'),
+                        f'GPON PROFILE {profile_key}')
                 console(mode, 'NETWORK MODE')
-                console(services, 'ONU SERVICES')
-                console(port, 'PORT CONFIGURATION')
+                console(profile['services'], 'ONU SERVICES')
+                console(profile['port'], 'PORT CONFIGURATION')
             return False
 
         if arg.split(' ')[0] == 'profile':
@@ -0,0 +1,109 @@
+import concurrent.futures
+import os
+
+import requests
+
+from analytics import port_summary
+from history import SECTIONS, digest
+from olt import OLTClient
+from utils import (OPTICS_RX_POWER, STATUS_OPTICS, STATUS_PORT, onu_online,
+                   to_number)
+
+# OLT sessions of this worker process, by host
+_clients = {}
+
+
+def _client(host, username, password):
+    client = _clients.get(host)
+    if client is None:
+        # Own session per OLT, cookies from different OLTs don't mix
+        client = OLTClient(host, username, password, session=requests.Session())
+        _clients[host] = client
+    return client
+
+
+def collect_summary(client):
+    '''
+    Reducer: per PON port aggregates, see analytics.port_summary
+    '''
+    return port_summary(client.get_bulk_onu_status())
+
+
+def collect_status_table(client):
+    '''
+    Reducer: (serial, port, online, rx power) tuples
+    '''
+    rows = []
+    for serial_number, onu in client.get_bulk_onu_status().items():
+        rows.append((serial_number, onu.get(STATUS_PORT), onu_online(onu),
+                     to_number((onu.get(STATUS_OPTICS) or {}).get(OPTICS_RX_POWER))))
+    return rows
+
+
+def collect_config_digests(client):
+    '''
+    Reducer: content hash per ONU and profile, enough to diff against last run
+    '''
+    configuration = client.get_configuration()
+    return {section: {key: digest(value)
+                      for key, value in configuration.get(section, {}).items()}
+            for section in SECTIONS}
+
+
+def _collect_shard(targets, reducer):
+    results = {}
+    errors = {}
+    for host, username, password in targets:
+        try:
+            results[host] = reducer(_client(host, username, password))
+        except Exception as ex:
+            # Login again next time
+            _clients.pop(host, None)
+            errors[host] = repr(ex)
+    return results, errors
+
+
+class ShardedCollector():
+    '''
+    Collects from many OLTs with a pool of processes. OLTs are split in
+    shards, one per process, and each process keeps its OLT sessions between
+    runs. Parsing and reducing happen in the worker, only the reducer's
+    result travels back. Reducers have to be module level functions
+    '''
+
+    def collect(self, reducer=collect_summary):
+        '''
+        Runs reducer(client) for every OLT. Returns ({host: result}, {host: error})
+        '''
+        futures = [executor.submit(_collect_shard, shard, reducer)
+                   for executor, shard in zip(self.executors, self.shards) if shard]
+        results = {}
+        errors = {}
+        for future in concurrent.futures.as_completed(futures):
+            shard_results, shard_errors = future.result()
+            results.update(shard_results)
+            errors.update(shard_errors)
+        return results, errors
+
+    def close(self):
+        for executor in self.executors:
+            executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __init__(self, targets, processes=None):
+        '''
+        targets is a list of (host, username, password)
+        '''
+        processes = processes or os.cpu_count() or 1
+        processes = max(1, min(processes, len(targets)))
+        self.shards = [list(targets[i::processes]) for i in range(processes)]
+        # One single process executor per shard, so a shard always lands
+        # in the same process and reuses its sessions
+        self.executors = [concurrent.futures.ProcessPoolExecutor(max_workers=1)
+                          for _ in range(processes)]
+        super().__init__()
@@ -0,0 +1,244 @@
+import bisect
+import gzip
+import json
+import os
+import time
+
+from utils import STATUS_NAME, STATUS_PORT, STATUS_PROFILE, normalize_serial
+
+
+class FleetIndex():
+    '''
+    Serial number locator across many OLTs.
+    Maps each ONU serial to host, profile, name, PON port and last seen time.
+    Built incrementally from get_configuration() and get_bulk_onu_status() snapshots.
+    '''
+    FORMAT_VERSION = 1
+
+    # Entry fields
+    HOST = 0
+    PROFILE = 1
+    NAME = 2
+    PORT = 3
+    LAST_SEEN = 4
+
+    def update_configuration(self, host, configuration, timestamp=None, prune=True):
+        '''
+        Index onu-list from an OLT configuration. With prune, ONUs no longer
+        configured on this host are dropped from the index
+        '''
+        if timestamp is None:
+            timestamp = int(time.time())
+        onus = configuration.get('onu-list', {})
+        seen = set()
+        for serial_number, onu in onus.items():
+            serial_number = normalize_serial(serial_number)
+            seen.add(serial_number)
+            self._set(serial_number, host, onu.get('profile'),
+                      onu.get('name'), None, timestamp)
+        if prune:
+            for serial_number in self._by_host.get(host, set()) - seen:
+                self._remove(serial_number)
+        return len(seen)
+
+    def update_status(self, host, status, timestamp=None):
+        '''
+        Index gpon_onu_list output, as returned by get_bulk_onu_status()
+        '''
+        if timestamp is None:
+            timestamp = int(time.time())
+        for serial_number, onu in status.items():
+            self._set(normalize_serial(serial_number), host,
+                      onu.get(STATUS_PROFILE), onu.get(STATUS_NAME),
+                      onu.get(STATUS_PORT), timestamp)
+        return len(status)
+
+    def remove_host(self, host):
+        '''
+        Drops every ONU indexed for host
+        '''
+        for serial_number in list(self._by_host.get(host, ())):
+            self._remove(serial_number)
+
+    def lookup(self, serial_number):
+        '''
+        Exact serial lookup. Returns a dict or None
+        '''
+        serial_number = normalize_serial(serial_number)
+        entry = self._entries.get(serial_number)
+        if entry is None:
+            return None
+        return self._as_dict(serial_number, entry)
+
+    def find_prefix(self, prefix, limit=None):
+        '''
+        Returns entries whose serial starts with prefix
+        '''
+        self._build_indexes()
+        prefix = normalize_serial(prefix)
+        start = bisect.bisect_left(self._serials, prefix)
+        results = []
+        for serial_number in self._serials[start:]:
+            if not serial_number.startswith(prefix):
+                break
+            results.append(self._as_dict(
+                serial_number, self._entries[serial_number]))
+            if limit and len(results) >= limit:
+                break
+        return results
+
+    def find_name(self, text, limit=None):
+        '''
+        Returns entries whose name has words starting with every word in text
+        Search is case insensitive
+        '''
+        self._build_indexes()
+        matches = None
+        for word in str(text).lower().split():
+            found = set()
+            start = bisect.bisect_left(self._words, (word, ''))
+            for token, serial_number in self._words[start:]:
+                if not token.startswith(word):
+                    break
+                found.add(serial_number)
+            matches = found if matches is None else matches & found
+            if not matches:
+                return []
+        results = []
+        for serial_number in sorted(matches or ()):
+            results.append(self._as_dict(
+                serial_number, self._entries[serial_number]))
+            if limit and len(results) >= limit:
+                break
+        return results
+
+    def hosts(self):
+        '''
+        Returns indexed hosts and their ONU count
+        '''
+        return {host: len(serials) for host, serials in self._by_host.items()}
+
+    def save(self, path):
+        '''
+        Writes index to a gzipped, column oriented JSON file
+        '''
+        hosts = {}
+        profiles = {}
+        columns = {
+            'serial': [], 'host': [], 'profile': [],
+            'name': [], 'port': [], 'seen': [],
+        }
+        for serial_number, entry in self._entries.items():
+            columns['serial'].append(serial_number)
+            columns['host'].append(hosts.setdefault(entry[self.HOST], len(hosts)))
+            columns['profile'].append(
+                profiles.setdefault(entry[self.PROFILE], len(profiles)))
+            columns['name'].append(entry[self.NAME])
+            columns['port'].append(entry[self.PORT])
+            columns['seen'].append(entry[self.LAST_SEEN])
+        data = {
+            'version': self.FORMAT_VERSION,
+            'hosts': list(hosts),
+            'profiles': list(profiles),
+            'columns': columns,
+        }
+        tmp_path = f'{path}.tmp'
+        with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=6) as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        '''
+        Loads an index written by save(). Missing file returns an empty index
+        '''
+        index = cls()
+        if not os.path.exists(path):
+            return index
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+        assert data.get('version') == cls.FORMAT_VERSION, \
+            f'Unsupported index version {data.get("version")}'
+        hosts = data['hosts']
+        profiles = data['profiles']
+        columns = data['columns']
+        rows = zip(columns['serial'], columns['host'], columns['profile'],
+                   columns['name'], columns['port'], columns['seen'])
+        for serial_number, host, profile, name, port, seen in rows:
+            host = hosts[host]
+            index._entries[serial_number] = [
+                host, profiles[profile], name, port, seen]
+            index._by_host.setdefault(host, set()).add(serial_number)
+        index._dirty = True
+        return index
+
+    def _set(self, serial_number, host, profile, name, port, timestamp):
+        entry = self._entries.get(serial_number)
+        if entry is None:
+            self._entries[serial_number] = [host, profile, name, port, timestamp]
+            self._by_host.setdefault(host, set()).add(serial_number)
+            self._dirty = True
+            return
+        # ONU moved to a different OLT
+        if entry[self.HOST] != host:
+            self._by_host[entry[self.HOST]].discard(serial_number)
+            self._by_host.setdefault(host, set()).add(serial_number)
+            entry[self.HOST] = host
+            # The old OLT's PON port means nothing here
+            entry[self.PORT] = port
+        # Keep known values if the snapshot doesn't have them
+        if profile is not None:
+            entry[self.PROFILE] = profile
+        if name is not None and name != entry[self.NAME]:
+            entry[self.NAME] = name
+            self._dirty = True
+        if port is not None:
+            entry[self.PORT] = port
+        entry[self.LAST_SEEN] = timestamp
+
+    def _remove(self, serial_number):
+        entry = self._entries.pop(serial_number, None)
+        if entry is not None:
+            self._by_host[entry[self.HOST]].discard(serial_number)
+            self._dirty = True
+
+    def _build_indexes(self):
+        '''
+        Sorted serial and name word lists, rebuilt only after changes
+        '''
+        if not self._dirty:
+            return
+        self._serials = sorted(self._entries)
+        words = []
+        for serial_number, entry in self._entries.items():
+            for word in set(str(entry[self.NAME] or '').lower().split()):
+                words.append((word, serial_number))
+        words.sort()
+        self._words = words
+        self._dirty = False
+
+    def _as_dict(self, serial_number, entry):
+        return {
+            'serial_number': serial_number,
+            'host': entry[self.HOST],
+            'profile': entry[self.PROFILE],
+            'name': entry[self.NAME],
+            'port': entry[self.PORT],
+            'last_seen': entry[self.LAST_SEEN],
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, serial_number):
+        return normalize_serial(serial_number) in self._entries
+
+    def __init__(self):
+        # serial -> [host, profile, name, port, last seen]
+        self._entries = {}
+        # host -> set of serials
+        self._by_host = {}
+        self._serials = []
+        self._words = []
+        self._dirty = False
+        super().__init__()
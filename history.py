@@ -0,0 +1,170 @@
+import hashlib
+import json
+import os
+import time
+import zlib
+
+# Sections stored entry by entry
+SECTIONS = ['onu-list', 'onu-profiles']
+
+
+def _encode(data):
+    '''
+    Canonical JSON, same content gives the same bytes
+    '''
+    return json.dumps(data, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def digest(data):
+    '''
+    Content hash of a configuration entry
+    '''
+    return hashlib.sha1(_encode(data)).hexdigest()
+
+
+class ConfigHistory():
+    '''
+    Versioned get_configuration() snapshots, stored content addressed.
+    Each ONU and profile is an object, so unchanged entries are shared
+    between versions. A version is a small manifest of object hashes
+    '''
+
+    def put(self, data):
+        '''
+        Stores an object, returns its hash
+        '''
+        raw = _encode(data)
+        key = hashlib.sha1(raw).hexdigest()
+        if key in self._known:
+            return key
+        path = self._object_path(key)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(zlib.compress(raw))
+            os.replace(tmp_path, path)
+        self._known.add(key)
+        return key
+
+    def get(self, digest):
+        '''
+        Loads an object by hash
+        '''
+        with open(self._object_path(digest), 'rb') as f:
+            return json.loads(zlib.decompress(f.read()))
+
+    def snapshot(self, host, configuration, timestamp=None):
+        '''
+        Stores a configuration version for host. Returns version id.
+        If nothing changed since the last version, returns the last version id
+        '''
+        if timestamp is None:
+            timestamp = time.time()
+        manifest = {'host': host, 'timestamp': timestamp}
+        rest = dict(configuration)
+        for section in SECTIONS:
+            entries = rest.pop(section, {})
+            manifest[section] = {key: self.put(value)
+                                 for key, value in entries.items()}
+        manifest['other'] = self.put(rest)
+
+        versions = self.versions(host)
+        if versions:
+            last = self.manifest(host, versions[-1])
+            if all(last[k] == manifest[k] for k in SECTIONS + ['other']):
+                return versions[-1]
+
+        version = time.strftime('%Y%m%dT%H%M%S', time.gmtime(timestamp))
+        while version in versions:
+            version = version + '.1'
+        path = self._manifest_path(host, version)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(zlib.compress(_encode(manifest)))
+        self._manifests[(host, version)] = manifest
+        return version
+
+    def versions(self, host):
+        '''
+        Sorted version ids for host
+        '''
+        path = os.path.join(self.root, 'versions', host)
+        if not os.path.isdir(path):
+            return []
+        return sorted(name[:-len('.json.z')] for name in os.listdir(path)
+                      if name.endswith('.json.z'))
+
+    def manifest(self, host, version):
+        '''
+        Returns the manifest of a version
+        '''
+        key = (host, version)
+        if key not in self._manifests:
+            with open(self._manifest_path(host, version), 'rb') as f:
+                self._manifests[key] = json.loads(zlib.decompress(f.read()))
+        return self._manifests[key]
+
+    def load(self, host, version):
+        '''
+        Rebuilds full configuration for a version
+        '''
+        manifest = self.manifest(host, version)
+        configuration = self.get(manifest['other'])
+        for section in SECTIONS:
+            configuration[section] = {key: self.get(digest)
+                                      for key, digest in manifest[section].items()}
+        return configuration
+
+    def get_onu(self, host, version, serial_number):
+        return self.get(self.manifest(host, version)['onu-list'][serial_number])
+
+    def get_profile(self, host, version, profile_id):
+        return self.get(self.manifest(host, version)['onu-profiles'][profile_id])
+
+    def diff(self, host, old_version, new_version):
+        '''
+        Compares two versions by hash, no objects are loaded.
+        Returns added, removed and changed keys per section
+        '''
+        old = self.manifest(host, old_version)
+        new = self.manifest(host, new_version)
+        changes = {}
+        for section in SECTIONS:
+            old_entries = old[section]
+            new_entries = new[section]
+            changes[section] = {
+                'added': sorted(new_entries.keys() - old_entries.keys()),
+                'removed': sorted(old_entries.keys() - new_entries.keys()),
+                'changed': sorted(key for key in old_entries.keys() & new_entries.keys()
+                                  if old_entries[key] != new_entries[key]),
+            }
+        changes['other'] = old['other'] != new['other']
+        return changes
+
+    def restore(self, olt_client, host, version, onus=(), profiles=(), batch_size=50):
+        '''
+        Sets ONUs and profiles back to a version. Profiles go first, since
+        ONUs reference them. Returns a batch.BatchResult per section
+        '''
+        manifest = self.manifest(host, version)
+        results = []
+        for section, keys in (('onu-profiles', profiles), ('onu-list', onus)):
+            entries = {key: self.get(manifest[section][key]) for key in keys}
+            if entries:
+                results.append(olt_client.set_entries(
+                    section, entries, chunk_size=batch_size))
+        return results
+
+    def _object_path(self, digest):
+        return os.path.join(self.root, 'objects', digest[:2], digest[2:])
+
+    def _manifest_path(self, host, version):
+        return os.path.join(self.root, 'versions', host, f'{version}.json.z')
+
+    def __init__(self, root):
+        self.root = root
+        self._manifests = {}
+        # Hashes known to be stored
+        self._known = set()
+        super().__init__()
@@ -0,0 +1,80 @@
+import concurrent.futures
+import threading
+import time
+
+
+class KeepAlive():
+    '''
+    Background keep-alive for OLTClients. Every interval seconds each client
+    is pinged with a cheap authenticated request, which keeps sessions and
+    connections warm. Expired sessions log in again. After max_failures
+    failed checks in a row a client is marked unhealthy (client.healthy)
+    so schedulers can skip it
+    '''
+
+    def check(self, client):
+        '''
+        Checks one client, returns its health dict
+        '''
+        health = self.health.setdefault(client.host, {
+            'healthy': True, 'failures': 0, 'latency': None,
+            'last_check': None, 'error': None,
+        })
+        started = time.perf_counter()
+        try:
+            if not client.ping(self.timeout):
+                # Session expired, login again
+                client.logged_in = client.login(self.timeout)
+                if not client.ping(self.timeout):
+                    raise ConnectionError('Session not alive after login')
+            health['latency'] = round(time.perf_counter() - started, 4)
+            health['failures'] = 0
+            health['error'] = None
+        except Exception as ex:
+            health['failures'] += 1
+            health['error'] = repr(ex)
+        health['last_check'] = time.time()
+        health['healthy'] = health['failures'] < self.max_failures
+        client.healthy = health['healthy']
+        return health
+
+    def check_all(self):
+        '''
+        Checks every client concurrently
+        '''
+        with concurrent.futures.ThreadPoolExecutor(self.workers) as executor:
+            list(executor.map(self.check, self.clients))
+        return self.health
+
+    def healthy_clients(self):
+        return [client for client in self.clients if client.healthy]
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.check_all()
+            self.stopped.wait(self.interval)
+
+    def start(self):
+        self.stopped.clear()
+        self.thread = threading.Thread(
+            target=self.run, name='ufiber-keepalive', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def __init__(self, clients, interval=60, timeout=5, max_failures=3, workers=8):
+        self.clients = list(clients)
+        self.interval = interval
+        self.timeout = timeout
+        self.max_failures = max_failures
+        self.workers = max(1, min(workers, len(self.clients)))
+        # host -> health dict
+        self.health = {}
+        self.stopped = threading.Event()
+        self.thread = None
+        super().__init__()
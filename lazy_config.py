@@ -0,0 +1,298 @@
+import collections.abc
+import json
+import json.scanner
+import mmap
+import re
+import tempfile
+
+# Unrolled string pattern, much faster than (?:[^"\\]|\\.)*
+_STRING = rb'"[^"\\]*(?:\\.[^"\\]*)*"'
+
+# Strings (with escapes) and brackets, enough to track nesting
+_TOKEN = re.compile(_STRING + rb'|[{}\[\]]')
+
+
+def _nested(depth):
+    '''
+    Regex for the inside of a JSON object/array nested up to depth levels.
+    Alternatives start with different characters, so it doesn't backtrack
+    '''
+    content = rb'(?:' + _STRING + rb'|[^"{}\[\]])*'
+    for _ in range(depth):
+        content = (rb'(?:' + _STRING + rb'|[^"{}\[\]]|\{' + content +
+                   rb'\}|\[' + content + rb'\])*')
+    return content
+
+
+# One "key": value member, and what follows it
+_VALUE = _nested(6)
+_MEMBER = re.compile(rb'\s*(' + _STRING + rb')\s*:\s*(\{' + _VALUE + rb'\}|\[' +
+                     _VALUE + rb'\]|' + _STRING + rb'|[^,}\s]+)\s*([,}])')
+_EMPTY = re.compile(rb'\s*\}')
+_SCALAR_END = re.compile(rb'\s*[,}]')
+_COLON = re.compile(rb'\s*:\s*')
+
+# C scanner, decodes one value at a position
+_SCAN = json.scanner.make_scanner(json.JSONDecoder())
+
+# Sections indexed entry by entry
+LAZY_SECTIONS = ['onu-list', 'onu-profiles']
+
+
+def _index_object(buffer, start):
+    '''
+    Indexes the object opening at start. Returns {key: (start, end)} byte
+    ranges of its values, and where the object ends. Nothing is decoded but
+    the keys.
+    Each member is matched by one regex call, deeper values fall back to
+    token by token scanning
+    '''
+    empty = _EMPTY.match(buffer, start + 1)
+    if empty:
+        return {}, empty.end()
+    index = {}
+    position = start + 1
+    while True:
+        match = _MEMBER.match(buffer, position)
+        if match is None:
+            return _scan_object(buffer, start)
+        index[json.loads(match.group(1))] = match.span(2)
+        if match.group(3) == b'}':
+            return index, match.end()
+        position = match.end()
+
+
+def _scan_object(buffer, start):
+    index = {}
+    depth = 0
+    key = None
+    value_start = None
+    for match in _TOKEN.finditer(buffer, start):
+        first = match.group()[:1]
+        if first == b'"':
+            if depth == 1:
+                if key is None:
+                    key = json.loads(match.group())
+                    colon = _COLON.match(buffer, match.end())
+                    if colon is None:
+                        raise ValueError(f'Invalid JSON member at {match.start()}')
+                    value_start = colon.end()
+                    if buffer[value_start:value_start + 1] not in (b'"', b'{', b'['):
+                        # Number, bool or null, no token of its own
+                        end = _SCALAR_END.search(buffer, value_start)
+                        index[key] = (value_start, end.start())
+                        key = None
+                else:
+                    # Plain string value
+                    index[key] = (match.start(), match.end())
+                    key = None
+            continue
+        if first in b'{[':
+            depth += 1
+            if depth == 2:
+                value_start = match.start()
+            continue
+        depth -= 1
+        if depth == 1:
+            index[key] = (value_start, match.end())
+            key = None
+        elif depth == 0:
+            return index, match.end()
+    raise ValueError('Unterminated JSON object')
+
+
+# Everything but quotes and brackets
+_NOT_STRUCTURE = bytes(range(256)).translate(None, b'"{}[]')
+
+
+def _structure(buffer, start, end, opened=b''):
+    '''
+    Brackets still open at end, scanning from start (outside any string)
+    with opened already open. Strings and plain values are dropped with C
+    level byte operations, then matched brackets cancel out.
+    A closing bracket in the result means an object closed in between.
+    Returns None when strings hold brackets or escaped quotes
+    '''
+    segment = buffer[start:end]
+    if b'\\"' in segment:
+        return None
+    # Strings without brackets are left as "" and go away
+    structure = segment.translate(None, _NOT_STRUCTURE).replace(b'""', b'')
+    if b'"' in structure:
+        return None
+    structure = opened + structure
+    while True:
+        reduced = structure.replace(b'{}', b'').replace(b'[]', b'')
+        if reduced == structure:
+            return structure
+        structure = reduced
+
+
+def _decode_at(buffer, position, size=4096):
+    '''
+    Decodes the value starting at position. Only a window of the buffer is
+    decoded, grown until the value fits
+    '''
+    while True:
+        window = buffer[position:position + size].decode('utf-8', 'replace')
+        try:
+            return _SCAN(window, 0)[0]
+        except (StopIteration, ValueError):
+            if position + size >= len(buffer):
+                raise ValueError(f'Invalid JSON value at {position}')
+            size *= 4
+
+
+class LazySection(collections.abc.Mapping):
+    '''
+    Read only mapping over one section. Single entries are found with a
+    plain search for their key, checked to be a member of the section itself
+    and not of a nested value, and decoded on their own. Listing keys builds
+    an index of byte ranges, once. Decoded entries are kept
+    '''
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index, self.limit = _index_object(self.buffer, self.start)
+        return self._index
+
+    def __getitem__(self, key):
+        if key in self.decoded:
+            return self.decoded[key]
+        if self._complete:
+            raise KeyError(key)
+        if self._index is not None:
+            start, end = self._index[key]
+            value = json.loads(self.buffer[start:end])
+        else:
+            value = self._find(key)
+        self.decoded[key] = value
+        return value
+
+    def _find(self, key):
+        needle = json.dumps(key, ensure_ascii=False).encode('utf-8')
+        position = self.start
+        while True:
+            hit = self.buffer.find(needle, position, self.limit)
+            if hit < 0:
+                raise KeyError(key)
+            position = hit + len(needle)
+            # Same string as a value is not followed by ':'
+            match = _COLON.match(self.buffer, position)
+            if not match:
+                continue
+            # Brackets opened since the section's brace, resumed from the
+            # last checked key when the hit is after it
+            checked, opened = self._checked
+            if hit < checked:
+                checked, opened = self.start + 1, b''
+            opened = _structure(self.buffer, checked, hit, opened)
+            if opened is None:
+                # Can't tell from a byte scan, decode the whole section once
+                section = _decode_at(self.buffer, self.start, self.limit - self.start)
+                for name, value in section.items():
+                    self.decoded.setdefault(name, value)
+                self._complete = True
+                return section[key]
+            if b'}' in opened or b']' in opened:
+                # Section closed before the hit
+                self.limit = hit
+                raise KeyError(key)
+            self._checked = (hit, opened)
+            if not opened:
+                return _decode_at(self.buffer, match.end())
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def __init__(self, buffer, start, limit=None):
+        '''
+        start is the offset of the section's opening brace, limit where the
+        next known section starts, until the section's own end is found
+        '''
+        self.buffer = buffer
+        self.start = start
+        self.limit = limit if limit is not None else len(buffer)
+        self.decoded = {}
+        # Every entry is in decoded
+        self._complete = False
+        self._index = None
+        # (position, brackets open there) of the last key checked
+        self._checked = (start + 1, b'')
+        super().__init__()
+
+
+class LazyConfiguration():
+    '''
+    Read only view over raw get.json. onu-list and onu-profiles decode only
+    the entries that are read. With spill, the raw reply is moved to a
+    memory mapped temporary file.
+    Other keys decode the whole reply the first time one is asked for
+    '''
+
+    def __getitem__(self, key):
+        if key in self.sections:
+            return self.sections[key]
+        return self.configuration()[key]
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def configuration(self):
+        '''
+        Full configuration, decoded once
+        '''
+        if self._configuration is None:
+            self._configuration = json.loads(self.buffer[:])['GET']
+        return self._configuration
+
+    def close(self):
+        if self._file is not None:
+            self.buffer.close()
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __init__(self, raw, spill=False):
+        '''
+        raw is the get.json reply as bytes
+        '''
+        self._file = None
+        self._configuration = None
+        if spill:
+            self._file = tempfile.TemporaryFile()
+            self._file.write(raw)
+            self._file.flush()
+            raw = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.buffer = raw
+        starts = {}
+        for section in LAZY_SECTIONS:
+            match = re.search(rb'"' + section.encode() + rb'"\s*:\s*\{', raw)
+            if match:
+                starts[section] = match.end() - 1
+        self.sections = {}
+        for section, start in starts.items():
+            # Key searches stop at the next section
+            after = [s for s in starts.values() if s > start]
+            self.sections[section] = LazySection(
+                raw, start, min(after) if after else None)
+        super().__init__()
@@ -0,0 +1,126 @@
+import time
+
+from utils import onu_online
+
+
+class MigrationAborted(Exception):
+    '''
+    Raised when too many migrated ONUs went offline or the OLT rejected some
+    '''
+
+    def __init__(self, message, migrated, offline, failed=None):
+        self.migrated = migrated
+        self.offline = offline
+        # serial -> error, entries the OLT rejected
+        self.failed = failed or {}
+        super().__init__(message)
+
+
+class ProfileMigration():
+    '''
+    Moves ONUs to another profile in waves. Only the profile field is sent.
+    Between waves it waits pause seconds and checks migrated ONUs are still
+    online. If more than max_offline (ratio) dropped, the migration stops
+    '''
+
+    def select(self, configuration=None):
+        '''
+        Returns {serial: current profile} for ONUs to migrate, from one snapshot
+        '''
+        if configuration is None:
+            configuration = self.client.get_configuration()
+        selected = {}
+        for serial_number, onu in configuration.get('onu-list', {}).items():
+            if onu.get('profile') == self.to_profile:
+                continue
+            if self.from_profile and onu.get('profile') != self.from_profile:
+                continue
+            if self.filter and not self.filter(serial_number, onu):
+                continue
+            selected[serial_number] = onu.get('profile')
+        return selected
+
+    def set_profiles(self, profiles):
+        '''
+        Sets profile for {serial: profile} in a single commit, failed entries
+        are retried. Returns a batch.BatchResult
+        '''
+        onu_list = {serial_number: {'profile': profile}
+                    for serial_number, profile in profiles.items()}
+        return self.client.set_entries(
+            'onu-list', onu_list, chunk_size=max(1, len(onu_list)))
+
+    def offline(self, serials, baseline):
+        '''
+        Returns serials that were online in baseline and are not anymore
+        '''
+        status = self.client.get_bulk_onu_status()
+        if status is False:
+            raise MigrationAborted('Could not read ONU status', serials, [])
+        offline = []
+        for serial_number in serials:
+            if not baseline.get(serial_number):
+                continue
+            if serial_number not in status or not onu_online(status[serial_number]):
+                offline.append(serial_number)
+        return offline
+
+    def run(self, selected=None, callback=None):
+        '''
+        Runs the migration. callback gets (wave number, serials) after each wave.
+        Returns list of migrated serials, raises MigrationAborted when ONUs
+        go offline or the OLT rejects part of a wave
+        '''
+        if selected is None:
+            selected = self.select()
+        serials = list(selected)
+        # Only ONUs online before the change count for health
+        status = self.client.get_bulk_onu_status()
+        if status is False:
+            raise MigrationAborted('Could not read ONU status', [], [])
+        baseline = {serial_number: onu_online(onu)
+                    for serial_number, onu in status.items()}
+        migrated = []
+        for wave, start in enumerate(range(0, len(serials), self.wave_size), 1):
+            wave_serials = serials[start:start + self.wave_size]
+            result = self.set_profiles(
+                {serial_number: self.to_profile for serial_number in wave_serials})
+            migrated.extend(result.succeeded)
+            if callback:
+                callback(wave, result.succeeded)
+            if result.failed:
+                if self.rollback and result.succeeded:
+                    self.set_profiles(
+                        {serial_number: selected[serial_number] for serial_number in result.succeeded})
+                raise MigrationAborted(
+                    f'{len(result.failed)} ONUs rejected by the OLT in wave {wave}',
+                    migrated, [], result.failed)
+            time.sleep(self.pause)
+            offline = self.offline(migrated, baseline)
+            watched = len([s for s in migrated if baseline.get(s)])
+            if watched and len(offline) / watched > self.max_offline:
+                if self.rollback and result.succeeded:
+                    self.set_profiles(
+                        {serial_number: selected[serial_number] for serial_number in result.succeeded})
+                raise MigrationAborted(
+                    f'{len(offline)} of {watched} migrated ONUs offline after wave {wave}',
+                    migrated, offline)
+        return migrated
+
+    def __init__(self, olt_client, to_profile, from_profile=None, filter=None,
+                 wave_size=50, pause=30, max_offline=0.05, rollback=False):
+        assert str(to_profile).startswith(
+            'profile-'), 'ONU profile has to start with "profile-"'
+        assert from_profile or filter, 'from_profile or filter is required'
+        assert wave_size > 0, 'wave_size has to be positive'
+        self.client = olt_client
+        self.to_profile = to_profile
+        self.from_profile = from_profile
+        # filter(serial_number, onu_config) -> True/False
+        self.filter = filter
+        self.wave_size = wave_size
+        self.pause = pause
+        self.max_offline = max_offline
+        # Rollback the failed wave to its previous profile
+        self.rollback = rollback
+        super().__init__()
@@ -1,12 +1,18 @@
+import concurrent.futures
 import ipaddress
 import json
+import time
 
 import requests
 import urllib3
 
-from onu import ONU, ONUWiFi
+from batch import commit_entries, merge_batch_replies
+from lazy_config import LazyConfiguration
+from onu import ONU, ONUDetail, ONUWiFi
 from onu_profile import ONUProfile
-from utils import pythonize
+from plan import Plan, split_payload
+from singleflight import SingleFlight
+from utils import normalize_serial, onu_online, to_python
 
 # No warnings for self signed certs
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -38,9 +44,10 @@ class OLTClient():
     # Base Client
     client = requests.Session()
 
-    def login(self):
+    def login(self, timeout=None):
         '''
         Login using credentials. Returns True/False
+        timeout in seconds bounds the request, None waits forever
         '''
         # Build post request to login
         form_data = {
@@ -53,11 +60,12 @@ class OLTClient():
                 verify=False,
                 url=self.url,
                 headers=HEADER_FORM_URLENCODED,
-                data=form_data
+                data=form_data,
+                timeout=timeout,
             )
         except ConnectionError as ex:
             raise LoginError(ex)
-        except TimeoutError as ex:
+        except (TimeoutError, requests.Timeout) as ex:
             raise LoginError(ex)
         # HTTP OK ?
         try:
@@ -71,63 +79,134 @@ class OLTClient():
             raise LoginError('Failed to log in with specified credentials')
         return True
 
+    def ping(self, timeout=5):
+        '''
+        Cheap authenticated request. Returns True if the session is alive
+        '''
+        url = self.url + '/api/edge/heartbeat.json'
+        started = time.perf_counter()
+        response = self.client.get(url, verify=False, timeout=timeout)
+        self._measure('heartbeat.json', started)
+        if response.status_code != 200:
+            return False
+        try:
+            heartbeat = json.loads(response.text)
+        except ValueError:
+            # Expired sessions get the login page
+            return False
+        return heartbeat.get('SESSION', True) not in (False, 'false')
+
     def get_configuration(self):
         '''
         Returns OLT general configuration. GPON configuration != here.
+        Concurrent callers share one request and one result, don't modify it
         '''
+        return self.flight.do('get_configuration', self._get_configuration)
+
+    def _get_configuration(self):
         assert self.logged_in, True
         url = self.url + '/api/edge/get.json'
+        started = time.perf_counter()
         response = self.client.get(url)
+        self._measure('get.json', started)
         if response.status_code != 200:
             return False
         configuration = response.text
         return json.loads(configuration)['GET']
 
-    def set_configuration(self, data):
+    def get_configuration_view(self, spill=False):
+        '''
+        Returns a LazyConfiguration over raw get.json. Only the ONUs and
+        profiles that are read get decoded. spill keeps the raw reply in a
+        memory mapped temporary file instead of memory
+        '''
+        return self.flight.do(('get_configuration_view', spill),
+                              self._get_configuration_view, spill)
+
+    def _get_configuration_view(self, spill):
+        assert self.logged_in, True
+        url = self.url + '/api/edge/get.json'
+        started = time.perf_counter()
+        response = self.client.get(url)
+        self._measure('get.json', started)
+        if response.status_code != 200:
+            return False
+        return LazyConfiguration(response.content, spill=spill)
+
+    def post_batch(self, data):
         '''
-        Sets configuration using data dict
+        Posts data dict to batch.json, returns the whole parsed reply
+        Payloads over max_payload bytes are split. Each part is its own commit,
+        so a failing part doesn't undo the parts before it: a split payload
+        can be partially applied. The merged reply keeps every part's errors.
+        In dry run, only recorded
         '''
         assert self.logged_in, True
+        if self.plan is not None:
+            return self.plan.record('batch.json', data)
+        payloads = split_payload(data, self.max_payload)
+        replies = [self._post('/api/edge/batch.json', payload)
+                   for payload in payloads]
+        if len(replies) == 1:
+            return replies[0]
+        return merge_batch_replies(replies)
+
+    def _post(self, path, data):
         # Base url
-        url = self.url + '/api/edge/batch.json'
+        url = self.url + path
         # Build headers, add CSRF token
         headers = HEADER_JSON
         headers['X-CSRF-TOKEN'] = self.client.cookies.get('X-CSRF-TOKEN')
         # Post configuration
+        started = time.perf_counter()
         response = self.client.post(
             verify=False,
             url=url,
             headers=HEADER_JSON,
             json=data,
         )
+        self._measure(path.rsplit('/', 1)[-1], started)
         # Raise error if status != HTTP 200, OK
         if response.status_code != 200:
             raise ConnectionError()
+        return json.loads(response.text)
+
+    def _measure(self, endpoint, started):
+        '''
+        Keeps a moving average of request latency per endpoint
+        '''
+        elapsed = time.perf_counter() - started
+        previous = self.latency.get(endpoint)
+        if previous is None:
+            self.latency[endpoint] = elapsed
+        else:
+            self.latency[endpoint] = previous * 0.8 + elapsed * 0.2
+
+    def set_configuration(self, data):
+        '''
+        Sets configuration using data dict. With max_payload a large write is
+        split in several commits and can be partially applied, see post_batch
+        '''
         action = list(data.keys())[0]
-        configuration = json.loads(response.text)[action]
+        configuration = self.post_batch(data)[action]
         return configuration
 
+    def set_entries(self, section, entries, action='SET', attempts=3, chunk_size=100):
+        '''
+        Sets {key: value} entries of a section (onu-list, onu-profiles) in chunks,
+        retrying only the entries that failed. Returns a batch.BatchResult
+        '''
+        return commit_entries(self, section, entries, action=action,
+                              attempts=attempts, chunk_size=chunk_size)
+
     def delete_configuration(self, data):
         '''
         Deletes configuration using data dict
         '''
         assert self.logged_in, True
-        # Base url
-        url = self.url + '/api/edge/delete.json'
-        # Build headers, add CSRF token
-        headers = HEADER_JSON
-        headers['X-CSRF-TOKEN'] = self.client.cookies.get('X-CSRF-TOKEN')
-        # Post configuration
-        response = self.client.post(
-            verify=False,
-            url=url,
-            headers=HEADER_JSON,
-            json=data,
-        )
-        # Raise error if status != HTTP 200, OK
-        if response.status_code != 200:
-            raise ConnectionError()
-        configuration = json.loads(response.text)['DELETE']
+        if self.plan is not None:
+            return self.plan.record('delete.json', data)['DELETE']
+        configuration = self._post('/api/edge/delete.json', data)['DELETE']
         return configuration
 
     def get_onu_profiles(self):
@@ -140,10 +219,16 @@ class OLTClient():
     def get_bulk_onu_status(self):
         '''
         Returns list and status of provisioned ONUs
+        Concurrent callers share one request and one result, don't modify it
         '''
+        return self.flight.do('get_bulk_onu_status', self._get_bulk_onu_status)
+
+    def _get_bulk_onu_status(self):
         assert self.logged_in, True
         url = self.url + '/api/edge/data.json?data=gpon_onu_list'
+        started = time.perf_counter()
         response = self.client.get(url)
+        self._measure('data.json', started)
         if response.status_code != 200:
             return False
         response = json.loads(response.text)['output']['GET_ONU_LIST']
@@ -153,6 +238,12 @@ class OLTClient():
             onu_status[serial_number] = onu
         return onu_status
 
+    def metrics(self):
+        '''
+        Request coalescing metrics for read endpoints
+        '''
+        return self.flight.metrics()
+
     def get_onu_status(self, serial_number):
         '''
         Returns status of provisioned ONU
@@ -167,25 +258,77 @@ class OLTClient():
         assert self.logged_in, True
         try:
             # Get raw config
-            onu_raw = self.get_configuration()['onu-list'][serial_number]
+            onu_raw = self.get_configuration_view()['onu-list'][serial_number]
         except KeyError:
             raise KeyError(
-                'Could not get configutation for onu {serial_number}'.format(serial_number))
+                f'Could not get configutation for onu {serial_number}')
+        return self._build_onu(serial_number, onu_raw)
+
+    def get_onus(self, configuration=None):
+        '''
+        Returns all ONUs from one configuration snapshot, by serial number
+        '''
+        if configuration is None:
+            configuration = self.get_configuration()
+        return {serial_number: self._build_onu(serial_number, onu_raw)
+                for serial_number, onu_raw in configuration['onu-list'].items()}
 
-        # Get raw wifi
-        wifi_raw = json.loads(json.dumps(onu_raw.pop('wifi')))
-        # Make it pythonic
-        wifi_parsed = pythonize(wifi_raw)
+    def _build_onu(self, serial_number, onu_raw):
+        # Make it pythonic, wifi included
+        onu_parsed = to_python(onu_raw, 'onu')
         # Make wifi
-        wifi = ONUWiFi(**wifi_parsed)
+        wifi = ONUWiFi(**onu_parsed.pop('wifi'))
         # Remove onu id
-        onu_raw.pop('lastOnuId')
+        onu_parsed.pop('lastOnuId', None)
         # Build onu
-        onu_parsed = pythonize(onu_raw)
         onu = ONU(olt_client=self, serial_number=serial_number,
                   wifi=wifi, **onu_parsed)
         return onu
 
+    def get_onu_detail(self, serial_number):
+        '''
+        Returns configuration, status and profile of an ONU as an ONUDetail
+        '''
+        serial_number = normalize_serial(serial_number)
+        detail = self.get_onu_details([serial_number])[serial_number]
+        if detail.config is None and detail.status is None:
+            raise KeyError(f'Unknown onu {serial_number}')
+        return detail
+
+    def get_onu_details(self, serial_numbers=None):
+        '''
+        Returns {serial: ONUDetail} for serial_numbers, all configured ONUs by default
+        Configuration and status are fetched once, concurrently
+        '''
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            configuration = executor.submit(self.get_configuration)
+            status = executor.submit(self.get_bulk_onu_status)
+            configuration = configuration.result()
+            status = status.result() or {}
+        onu_list = configuration['onu-list']
+        profiles_raw = configuration['onu-profiles']
+        if serial_numbers is None:
+            serial_numbers = list(onu_list)
+        # Profiles are converted once, shared by their ONUs
+        profiles = {}
+        details = {}
+        for serial_number in serial_numbers:
+            serial_number = normalize_serial(serial_number)
+            config = None
+            profile = None
+            if serial_number in onu_list:
+                config = to_python(onu_list[serial_number], 'onu')
+                profile_id = config.get('profile')
+                if profile_id not in profiles and profile_id in profiles_raw:
+                    profiles[profile_id] = to_python(
+                        profiles_raw[profile_id], 'profile')
+                profile = profiles.get(profile_id)
+            onu_status = status.get(serial_number)
+            details[serial_number] = ONUDetail(
+                serial_number, config, onu_status, profile,
+                onu_online(onu_status) if onu_status else False)
+        return details
+
     def get_onu_profile(self, profile_id):
         '''
         Get ONU profile
@@ -193,36 +336,52 @@ class OLTClient():
         assert self.logged_in, True
         try:
             # Get raw config
-            profile_raw = self.get_onu_profiles()[profile_id]
+            profile_raw = self.get_configuration_view()['onu-profiles'][profile_id]
         except KeyError:
             raise KeyError(
-                'Could not get configutation for profile {profile_id}'.format(profile_id))
-        # Make it pythonic
-        profile_parsed = pythonize(profile_raw)
+                f'Could not get configutation for profile {profile_id}')
+        return self._build_onu_profile(profile_raw)
+
+    def get_profiles(self, configuration=None, errors=None):
+        '''
+        Returns all ONU profiles from one configuration snapshot, by profile id.
+        Profiles that can't be built are skipped, errors dict gets the reason
+        '''
+        if configuration is None:
+            configuration = self.get_configuration()
+        profiles = {}
+        for profile_id, profile_raw in configuration['onu-profiles'].items():
+            try:
+                profiles[profile_id] = self._build_onu_profile(profile_raw)
+            except (AssertionError, KeyError, TypeError, ValueError) as ex:
+                if errors is not None:
+                    errors[profile_id] = str(ex) or repr(ex)
+        return profiles
+
+    def _build_onu_profile(self, profile_raw):
+        # Make it pythonic, nested blocks included
+        profile_parsed = to_python(profile_raw, 'profile')
 
         # Ports are auto by default
         profile_parsed.pop('port')
 
-        # Ports are auto by default
-        services_raw = profile_parsed.pop('services')
-        # Make it pythonic
-        services_parsed = pythonize(services_raw)
+        # Services go as keyword arguments
+        services_parsed = profile_parsed.pop('services')
 
         # Get mode
         bridge_mode = profile_parsed.pop('bridge_mode')
         router_mode = profile_parsed.pop('router_mode')
 
         # No dhcp relay at the moment
-        router_mode.pop('dhcp-relay')
+        router_mode.pop('dhcp_relay', None)
 
         # Router / Bridge
         if profile_parsed['mode'] == ONUProfile.MODE_BRIDGE:
-            mode_raw = bridge_mode
-        if profile_parsed['mode'] == ONUProfile.MODE_ROUTER:
-            mode_raw = router_mode
-
-        # Make it pythonic
-        mode_parsed = pythonize(mode_raw)
+            mode_parsed = self._bridge_ports(bridge_mode)
+        elif profile_parsed['mode'] == ONUProfile.MODE_ROUTER:
+            mode_parsed = router_mode
+        else:
+            raise ValueError(f'Invalid profile mode, {profile_parsed["mode"]}')
 
         # Adjust bw limit
         profile_parsed['bandwidth_limit_up'] = int(
@@ -234,7 +393,58 @@ class OLTClient():
                              mode_parsed, **services_parsed)
         return profile
 
-    def __init__(self, host, username, password):
+    @staticmethod
+    def _bridge_ports(bridge_mode):
+        '''
+        Maps bridge-mode port blocks to ONUProfile keyword arguments,
+        port 1 -> port_1_include_vlan / port_1_native_vlan, wifi -> wifi_native_vlan
+        '''
+        mode_parsed = {}
+        for port_id, port in bridge_mode.get('port', {}).items():
+            if port_id == 'wifi':
+                if 'native_vlan' in port:
+                    mode_parsed['wifi_native_vlan'] = port['native_vlan']
+                continue
+            if port_id not in ('1', '2', '3', '4'):
+                raise ValueError(f'Invalid bridge port, {port_id}')
+            if 'include_vlan' in port:
+                include_vlan = port['include_vlan']
+                # A single VLAN comes as a plain value
+                if not isinstance(include_vlan, list):
+                    include_vlan = [include_vlan]
+                mode_parsed[f'port_{port_id}_include_vlan'] = include_vlan
+            if 'native_vlan' in port:
+                mode_parsed[f'port_{port_id}_native_vlan'] = port['native_vlan']
+        return mode_parsed
+
+    def start_plan(self, max_payload=None):
+        '''
+        Enters dry run: writes are recorded in a plan.Plan instead of sent
+        '''
+        self.plan = Plan(self, max_payload or self.max_payload)
+        return self.plan
+
+    def stop_plan(self):
+        '''
+        Leaves dry run, returns the recorded plan
+        '''
+        plan, self.plan = self.plan, None
+        return plan
+
+    def __init__(self, host, username, password, session=None,
+                 dry_run=False, max_payload=None):
+        # Custom session, e.g. cassette.RecordingSession / ReplaySession
+        if session is not None:
+            self.client = session
+        # Coalesces concurrent reads
+        self.flight = SingleFlight()
+        # Split batch.json payloads over this many bytes
+        self.max_payload = max_payload
+        # Latency per endpoint, seconds
+        self.latency = {}
+        self.plan = Plan(self, max_payload) if dry_run else None
+        # Set by keepalive.KeepAlive
+        self.healthy = True
         self.host = host
         self.url = 'https://{host}'.format(host=host)
         self.username = username
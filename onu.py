@@ -175,11 +175,10 @@ class ONU():
         Use OLT Client to retrieve ONU status
         '''
         if self.onu:
-            onu_list = self.client.get_onu_status()
-            for onu in onu_list:
-                if onu['serial_number'] == self.serial_number:
-                    return onu
-            return False
+            try:
+                return self.client.get_onu_status(self.serial_number)
+            except KeyError:
+                return False
         raise Warning('ONU not initialized')
 
     def __init__(self, olt_client,
@@ -206,6 +205,7 @@ class ONU():
         serial_number_prefix = str(serial_number).strip()[:4]
         serial_number_sufix = str(serial_number).strip().lower()[4:]
         serial_number = serial_number_prefix + serial_number_sufix
+        self.serial_number = serial_number
 
         # ONU profile starts with 'profile-'
         assert str(
@@ -238,3 +238,30 @@ class ONU():
             }
         }
         super().__init__()
+
+
+class ONUDetail():
+    '''
+    Combined view of one ONU: configuration, status and resolved profile
+    config and profile are pythonized dicts, status is gpon_onu_list output
+    Missing parts are None, e.g. status of an ONU that never came online
+    '''
+
+    @property
+    def name(self):
+        return self.config.get('name') if self.config else None
+
+    @property
+    def profile_id(self):
+        return self.config.get('profile') if self.config else None
+
+    def __repr__(self):
+        return f'<ONUDetail {self.serial_number} {self.profile_id} online={self.online}>'
+
+    def __init__(self, serial_number, config=None, status=None, profile=None, online=False):
+        self.serial_number = serial_number
+        self.config = config
+        self.status = status
+        self.profile = profile
+        self.online = online
+        super().__init__()
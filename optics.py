@@ -0,0 +1,186 @@
+import math
+
+from utils import (OPTICS_RX_POWER, OPTICS_TX_POWER, STATUS_OPTICS,
+                   STATUS_PORT, to_number)
+
+
+class OpticsMonitor():
+    '''
+    Per ONU reference baselines (mean and variance) of RX/TX optical power,
+    compared with a fast EWMA of recent polls.
+    Feed every get_bulk_onu_status() poll to update(). The reference is
+    learned over the warmup polls, then its mean only follows samples that
+    are not drifting, slowly. ONUs whose recent power is away from their reference
+    are reported as drifting, and PON ports with many drifting ONUs at once
+    as likely feeder problems.
+    A drifted ONU that holds steady at its new level for settle polls (fiber
+    repair, ONU swap) is re-baselined there. reset() forgets an ONU's baseline
+    Each ONU keeps a fixed size state, an update is one pass over the poll
+    '''
+    # State slots, per channel: reference mean, reference variance, recent,
+    # level a drift settled at and polls it has held there
+    RX_MEAN = 0
+    RX_VAR = 1
+    RX_RECENT = 2
+    RX_LEVEL = 3
+    RX_STEADY = 4
+    TX_MEAN = 5
+    TX_VAR = 6
+    TX_RECENT = 7
+    TX_LEVEL = 8
+    TX_STEADY = 9
+    SAMPLES = 10
+
+    def update(self, status):
+        '''
+        Checks a poll against baselines. Drifting samples are not folded into
+        the reference, so a slow fall can't become the new normal.
+        Returns {'onus': [...], 'ports': [...]} with drifting ONUs and ports
+        '''
+        drifting = []
+        port_totals = {}
+        port_drifting = {}
+        fast_alpha = self.fast_alpha
+        for serial_number, onu in status.items():
+            optics = onu.get(STATUS_OPTICS) or {}
+            rx_power = to_number(optics.get(OPTICS_RX_POWER))
+            tx_power = to_number(optics.get(OPTICS_TX_POWER))
+            if rx_power is None and tx_power is None:
+                continue
+            port = onu.get(STATUS_PORT)
+            port_totals[port] = port_totals.get(port, 0) + 1
+
+            state = self.baselines.get(serial_number)
+            if state is None:
+                self.baselines[serial_number] = [
+                    rx_power, 0.0, rx_power, None, 0,
+                    tx_power, 0.0, tx_power, None, 0, 1]
+                continue
+
+            samples = state[self.SAMPLES]
+            warm = samples >= self.warmup
+            # Cumulative mean while warming up, then a slow EWMA
+            alpha = self.alpha if warm else 1 / (samples + 1)
+            drift = {}
+            for value, mean_slot, name in ((rx_power, self.RX_MEAN, 'rx'),
+                                           (tx_power, self.TX_MEAN, 'tx')):
+                if value is None:
+                    continue
+                mean = state[mean_slot]
+                if mean is None:
+                    state[mean_slot] = state[mean_slot + 2] = value
+                    continue
+                variance = state[mean_slot + 1]
+                recent = state[mean_slot + 2] + fast_alpha * (value - state[mean_slot + 2])
+                state[mean_slot + 2] = recent
+                delta = value - mean
+                if warm:
+                    limit = max(self.sigmas * math.sqrt(variance), self.min_delta)
+                    if abs(recent - mean) > limit:
+                        if self._settled(state, mean_slot, value, limit):
+                            # Steady at a new level, that's the baseline now
+                            state[mean_slot] = recent
+                            continue
+                        drift[name] = round(recent - mean, 2)
+                        continue
+                    state[mean_slot + 3] = None
+                    state[mean_slot + 4] = 0
+                    # Outliers stay out of the reference
+                    if abs(delta) > limit:
+                        continue
+                state[mean_slot] = mean + alpha * delta
+                # Noise level is learned in warmup only, else a drift widens it
+                if not warm:
+                    state[mean_slot + 1] = (1 - alpha) * (variance + alpha * delta * delta)
+            state[self.SAMPLES] += 1
+
+            if drift:
+                drifting.append({
+                    'serial_number': serial_number,
+                    'port': port,
+                    'rx_power': rx_power,
+                    'tx_power': tx_power,
+                    'drift': drift,
+                })
+                port_drifting[port] = port_drifting.get(port, 0) + 1
+
+        ports = []
+        for port, count in port_drifting.items():
+            if count >= self.port_min_onus and count / port_totals[port] >= self.port_ratio:
+                ports.append({
+                    'port': port,
+                    'drifting': count,
+                    'onus': port_totals[port],
+                })
+        return {'onus': drifting, 'ports': ports}
+
+    def _settled(self, state, mean_slot, value, limit):
+        '''
+        Counts drifting polls within half the limit of the level the drift
+        started at. A slow fall keeps leaving it, so it never settles
+        '''
+        level = state[mean_slot + 3]
+        if level is None or abs(value - level) > limit / 2:
+            state[mean_slot + 3] = value
+            state[mean_slot + 4] = 1
+        else:
+            state[mean_slot + 4] += 1
+        if state[mean_slot + 4] < self.settle:
+            return False
+        state[mean_slot + 3] = None
+        state[mean_slot + 4] = 0
+        return True
+
+    def reset(self, serial_number):
+        '''
+        Forgets an ONU's baseline, it is learned again from the next poll.
+        Use after planned work on its fiber or a swap
+        '''
+        self.baselines.pop(serial_number, None)
+
+    def baseline(self, serial_number):
+        '''
+        Returns current baseline for an ONU, or None
+        '''
+        state = self.baselines.get(serial_number)
+        if state is None:
+            return None
+        return {
+            'rx_mean': state[self.RX_MEAN],
+            'rx_std': math.sqrt(state[self.RX_VAR]),
+            'rx_recent': state[self.RX_RECENT],
+            'tx_mean': state[self.TX_MEAN],
+            'tx_std': math.sqrt(state[self.TX_VAR]),
+            'tx_recent': state[self.TX_RECENT],
+            'samples': state[self.SAMPLES],
+        }
+
+    def prune(self, status):
+        '''
+        Drops baselines for ONUs missing from status
+        '''
+        for serial_number in self.baselines.keys() - status.keys():
+            del self.baselines[serial_number]
+
+    def __init__(self, alpha=0.01, fast_alpha=0.3, sigmas=4.0, min_delta=1.5,
+                 warmup=10, settle=30, port_ratio=0.3, port_min_onus=3):
+        # Reference EWMA weight after warmup. A fall slower than about
+        # min_delta * alpha dB per poll is taken as the baseline moving
+        self.alpha = alpha
+        # Recent power EWMA weight, smooths single noisy polls
+        self.fast_alpha = fast_alpha
+        # Drift when further than sigmas * std, and at least min_delta dB
+        self.sigmas = sigmas
+        self.min_delta = min_delta
+        # Polls before an ONU can be flagged
+        self.warmup = warmup
+        # Polls steady at a new level before it becomes the baseline
+        self.settle = settle
+        # Feeder alert when this share of a port's ONUs drift together
+        self.port_ratio = port_ratio
+        self.port_min_onus = port_min_onus
+        # serial -> [rx mean, rx var, rx recent, rx level, rx steady,
+        #            tx mean, tx var, tx recent, tx level, tx steady, samples]
+        self.baselines = {}
+        super().__init__()
+
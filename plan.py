@@ -0,0 +1,106 @@
+import json
+
+# Latency used when the OLT hasn't been measured yet, seconds
+DEFAULT_LATENCY = 1.0
+
+
+def payload_size(data):
+    '''
+    Bytes of data as sent by requests json=
+    '''
+    return len(json.dumps(data).encode('utf-8'))
+
+
+def split_payload(data, max_bytes):
+    '''
+    Splits {action: {section: {key: value}}} in payloads of at most max_bytes.
+    An entry is never split, so one oversized entry goes alone
+    '''
+    if not max_bytes or payload_size(data) <= max_bytes:
+        return [data]
+    payloads = []
+    for action, sections in data.items():
+        if not isinstance(sections, dict):
+            payloads.append({action: sections})
+            continue
+        for section, entries in sections.items():
+            if not isinstance(entries, dict):
+                payloads.append({action: {section: entries}})
+                continue
+            # Envelope overhead, then each entry adds its own size
+            base = payload_size({action: {section: {}}})
+            chunk = {}
+            size = base
+            for key, value in entries.items():
+                # Braces of {key: value} account for the ', ' separator
+                entry_size = payload_size({key: value})
+                if chunk and size + entry_size > max_bytes:
+                    payloads.append({action: {section: chunk}})
+                    chunk = {}
+                    size = base
+                chunk[key] = value
+                size += entry_size
+            if chunk:
+                payloads.append({action: {section: chunk}})
+    return payloads
+
+
+class Plan():
+    '''
+    Write operations recorded by an OLTClient in dry run mode
+    '''
+
+    def record(self, endpoint, data):
+        '''
+        Records a write, split to fit max_payload. Returns a successful reply
+        '''
+        for payload in split_payload(data, self.max_payload):
+            action = list(payload.keys())[0]
+            section = payload[action]
+            entries = 0
+            if isinstance(section, dict):
+                entries = sum(len(v) if isinstance(v, dict) else 1
+                              for v in section.values())
+            self.operations.append({
+                'endpoint': endpoint,
+                'action': action,
+                'sections': list(section) if isinstance(section, dict) else [],
+                'entries': entries,
+                'bytes': payload_size(payload),
+                'payload': payload,
+            })
+        return {action: {'success': '1', 'failure': '0'} for action in data}
+
+    def report(self):
+        '''
+        Request count, payload sizes and estimated duration from the client's
+        measured latency per endpoint
+        '''
+        sizes = [operation['bytes'] for operation in self.operations]
+        seconds = 0.0
+        per_endpoint = {}
+        for operation in self.operations:
+            endpoint = operation['endpoint']
+            latency = self.client.latency.get(endpoint, DEFAULT_LATENCY)
+            seconds += latency
+            stats = per_endpoint.setdefault(
+                endpoint, {'requests': 0, 'bytes': 0, 'latency': latency})
+            stats['requests'] += 1
+            stats['bytes'] += operation['bytes']
+        return {
+            'requests': len(self.operations),
+            'entries': sum(operation['entries'] for operation in self.operations),
+            'bytes': sum(sizes),
+            'max_bytes': max(sizes) if sizes else 0,
+            'estimated_seconds': round(seconds, 3),
+            'endpoints': per_endpoint,
+        }
+
+    def clear(self):
+        self.operations = []
+
+    def __init__(self, olt_client, max_payload=None):
+        self.client = olt_client
+        self.max_payload = max_payload
+        self.operations = []
+        super().__init__()
@@ -0,0 +1,212 @@
+import csv
+import json
+import os
+import time
+
+import requests
+
+from onu import ONU, ONUWiFi
+from utils import STATUS_PORT, normalize_serial
+
+
+class ProvisioningRule():
+    '''
+    Picks profile and name for new ONUs matching serial prefix and/or PON port.
+    Name is a format string, {serial_number} and {port} are available
+    '''
+
+    def matches(self, serial_number, status):
+        '''
+        Returns True if the ONU matches this rule
+        '''
+        if self.serial_prefix and not serial_number.startswith(self.serial_prefix):
+            return False
+        if self.port is not None and str(status.get(STATUS_PORT)) != str(self.port):
+            return False
+        return True
+
+    def build(self, serial_number, status):
+        '''
+        Returns provisioning values for a matching ONU
+        '''
+        return {
+            'profile': self.profile,
+            'name': self.name.format(serial_number=serial_number,
+                                     port=status.get(STATUS_PORT)),
+            'pppoe_user': self.pppoe_user,
+            'pppoe_password': self.pppoe_password,
+        }
+
+    def __init__(self, profile, name='{serial_number}',
+                 serial_prefix=None, port=None,
+                 pppoe_user='', pppoe_password=''):
+        assert str(profile).startswith(
+            'profile-'), 'ONU profile has to start with "profile-"'
+        self.profile = profile
+        self.name = name
+        self.serial_prefix = normalize_serial(
+            serial_prefix) if serial_prefix else None
+        self.port = port
+        self.pppoe_user = pppoe_user
+        self.pppoe_password = pppoe_password
+        super().__init__()
+
+
+def load_inventory(path):
+    '''
+    Loads pre-registered ONUs from a CSV file with header:
+    serial_number,profile,name[,pppoe_user,pppoe_password]
+    '''
+    inventory = {}
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            serial_number = normalize_serial(row['serial_number'])
+            inventory[serial_number] = {
+                'profile': row['profile'].strip(),
+                'name': row['name'].strip(),
+                'pppoe_user': (row.get('pppoe_user') or '').strip(),
+                'pppoe_password': (row.get('pppoe_password') or '').strip(),
+            }
+    return inventory
+
+
+class Provisioner():
+    '''
+    Provisions ONUs that show up in gpon_onu_list but are not in onu-list.
+    Inventory entries win over rules, rules are checked in order.
+    Provisioned serials are kept in state_file so restarts don't redo work
+    '''
+
+    def pending(self, status=None, configuration=None):
+        '''
+        Returns {serial: values} for unconfigured ONUs matching inventory or rules
+        '''
+        if status is None:
+            status = self.client.get_bulk_onu_status()
+        if configuration is None:
+            configuration = self.client.get_configuration()
+        # Failed reads (non 200 replies) skip this poll
+        if status is False or configuration is False:
+            return {}
+        configured = set(configuration.get('onu-list', {}))
+        pending = {}
+        for serial_number, onu_status in status.items():
+            if serial_number in configured or serial_number in self.provisioned:
+                continue
+            try:
+                values = self.match(serial_number, onu_status)
+            except (KeyError, IndexError, ValueError) as ex:
+                # Bad name template in a rule
+                self.errors[serial_number] = f'Invalid rule: {ex!r}'
+                continue
+            if values:
+                pending[serial_number] = values
+        return pending
+
+    def match(self, serial_number, status):
+        '''
+        Returns provisioning values for an ONU, or None
+        '''
+        if serial_number in self.inventory:
+            return self.inventory[serial_number]
+        for rule in self.rules:
+            if rule.matches(serial_number, status):
+                return rule.build(serial_number, status)
+        return None
+
+    def provision(self, pending):
+        '''
+        Commits pending ONUs in batches of batch_size, at most one commit
+        every min_interval seconds. Returns provisioned serials.
+        ONUs that fail validation or are rejected by the OLT end up in errors
+        '''
+        done = []
+        serials = list(pending)
+        for start in range(0, len(serials), self.batch_size):
+            batch = {}
+            for serial_number in serials[start:start + self.batch_size]:
+                values = pending[serial_number]
+                try:
+                    onu = ONU(self.client, serial_number, values['profile'],
+                              values['name'], ONUWiFi(),
+                              pppoe_user=values['pppoe_user'],
+                              pppoe_password=values['pppoe_password'])
+                except (AssertionError, ValueError) as ex:
+                    # Bad rule or inventory values, skip just this ONU
+                    self.errors[serial_number] = str(ex) or 'Invalid ONU'
+                    continue
+                batch.update(onu.onu)
+            if not batch:
+                continue
+            # Rate limit commits
+            wait = self.last_commit + self.min_interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            result = self.client.set_entries(
+                'onu-list', batch, chunk_size=self.batch_size)
+            self.last_commit = time.monotonic()
+            self.errors.update(result.failed)
+            for serial_number in result.succeeded:
+                self.errors.pop(serial_number, None)
+            done.extend(result.succeeded)
+            self.provisioned.update(result.succeeded)
+            self.save_state()
+        return done
+
+    def run_once(self):
+        '''
+        One poll: find pending ONUs and provision them
+        '''
+        return self.provision(self.pending())
+
+    def watch(self, interval=10, callback=None):
+        '''
+        Polls forever every interval seconds. callback gets provisioned serials
+        '''
+        while True:
+            try:
+                done = self.run_once()
+            except (ConnectionError, requests.RequestException):
+                # Retried on next poll
+                done = []
+            if done and callback:
+                callback(done)
+            time.sleep(interval)
+
+    def forget(self, serial_number):
+        '''
+        Allows a serial to be provisioned again
+        '''
+        self.provisioned.discard(normalize_serial(serial_number))
+        self.save_state()
+
+    def save_state(self):
+        if not self.state_file:
+            return
+        tmp_path = f'{self.state_file}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'provisioned': sorted(self.provisioned)}, f)
+        os.replace(tmp_path, self.state_file)
+
+    def load_state(self):
+        if self.state_file and os.path.exists(self.state_file):
+            with open(self.state_file, encoding='utf-8') as f:
+                self.provisioned = set(json.load(f)['provisioned'])
+
+    def __init__(self, olt_client, rules=None, inventory=None,
+                 state_file=None, batch_size=50, min_interval=1.0):
+        self.client = olt_client
+        self.rules = list(rules or [])
+        # Inventory can be a dict or a CSV path
+        if isinstance(inventory, str):
+            inventory = load_inventory(inventory)
+        self.inventory = inventory or {}
+        self.state_file = state_file
+        self.batch_size = batch_size
+        self.min_interval = min_interval
+        self.last_commit = 0
+        self.provisioned = set()
+        # serial -> last error, for ONUs that could not be provisioned
+        self.errors = {}
+        self.load_state()
+        super().__init__()
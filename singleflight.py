@@ -0,0 +1,75 @@
+import threading
+import time
+
+
+class _Call():
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+        super().__init__()
+
+
+class SingleFlight():
+    '''
+    Coalesces concurrent calls with the same key. The first caller runs the
+    function, callers arriving while it runs wait and get the same result
+    (or exception). Results are shared, callers must not modify them
+    '''
+
+    def do(self, key, function, *args, **kwargs):
+        with self.lock:
+            self.calls[key] = self.calls.get(key, 0) + 1
+            call = self.in_flight.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced[key] = self.coalesced.get(key, 0) + 1
+                leader = False
+            else:
+                call = self.in_flight[key] = _Call()
+                self.requests[key] = self.requests.get(key, 0) + 1
+                leader = True
+
+        if not leader:
+            started = time.perf_counter()
+            call.done.wait()
+            with self.lock:
+                self.wait_time[key] = self.wait_time.get(
+                    key, 0.0) + time.perf_counter() - started
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function(*args, **kwargs)
+        except Exception as ex:
+            call.error = ex
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+            call.done.set()
+        return call.result
+
+    def metrics(self):
+        '''
+        Per key: calls, requests actually made, coalesced calls, seconds spent waiting
+        '''
+        with self.lock:
+            return {key: {
+                'calls': self.calls[key],
+                'requests': self.requests.get(key, 0),
+                'coalesced': self.coalesced.get(key, 0),
+                'wait_time': round(self.wait_time.get(key, 0.0), 6),
+                'in_flight': key in self.in_flight,
+            } for key in self.calls}
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.calls = {}
+        self.requests = {}
+        self.coalesced = {}
+        self.wait_time = {}
+        super().__init__()
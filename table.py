@@ -0,0 +1,179 @@
+import io
+import pydoc
+import sys
+
+
+class Table():
+    '''
+    Buffered table renderer for CLI listings.
+    Rows are dicts keyed by column. Output is written in a single call
+    '''
+    # Flush streamed output every N rows, column widths fit the first chunk
+    STREAM_CHUNK = 256
+
+    def add(self, row):
+        '''
+        Adds a row dict
+        '''
+        self.rows.append(row)
+
+    def extend(self, rows):
+        '''
+        Adds rows from any iterable, can be a generator
+        '''
+        self.rows.extend(rows)
+
+    def select(self, columns):
+        '''
+        Sets visible columns, in order. Accepts a list or comma separated string
+        '''
+        if isinstance(columns, str):
+            columns = [c.strip() for c in columns.split(',') if c.strip()]
+        for column in columns:
+            assert column in self.columns, f'Unknown column {column}'
+        self.visible = list(columns)
+        return self
+
+    def where(self, column, value):
+        '''
+        Keeps rows where column matches value, case insensitive
+        '''
+        assert column in self.columns, f'Unknown column {column}'
+        self.filters.append((column, str(value).lower()))
+        return self
+
+    def sort(self, column, reverse=False):
+        '''
+        Sorts rows by column
+        '''
+        assert column in self.columns, f'Unknown column {column}'
+        self.sort_key = column
+        self.sort_reverse = reverse
+        return self
+
+    def render(self):
+        '''
+        Returns the table as a string
+        '''
+        rows = self._rows()
+        if self.sort_key:
+            rows = sorted(rows, key=lambda r: _sort_value(r.get(self.sort_key)),
+                          reverse=self.sort_reverse)
+        else:
+            rows = list(rows)
+        columns = self.visible
+        lines = [[_cell(row.get(c)) for c in columns] for row in rows]
+        out = io.StringIO()
+        _write_lines(out, columns, lines)
+        out.write(f'{len(lines)} rows\n')
+        return out.getvalue()
+
+    def show(self, pager=False, stream=None):
+        '''
+        Prints the table with one write, or through the pager
+        '''
+        output = self.render()
+        if pager:
+            pydoc.pager(output)
+            return
+        stream = stream or sys.stdout
+        stream.write(output)
+        stream.flush()
+
+    def stream(self, rows, stream=None):
+        '''
+        Prints rows as they come, no sorting. Filters still apply
+        Output is buffered and flushed every STREAM_CHUNK rows. Same layout
+        as render(), columns are sized on the first chunk
+        '''
+        stream = stream or sys.stdout
+        columns = self.visible
+        out = io.StringIO()
+        lines = []
+        line_format = None
+        count = 0
+        for row in rows:
+            if not self._match(row):
+                continue
+            cells = [_cell(row.get(c)) for c in columns]
+            count += 1
+            if line_format is None:
+                lines.append(cells)
+                if len(lines) < self.STREAM_CHUNK:
+                    continue
+                line_format = _write_lines(out, columns, lines)
+            else:
+                out.write(line_format.format(*cells))
+            if count % self.STREAM_CHUNK == 0:
+                stream.write(out.getvalue())
+                stream.flush()
+                out = io.StringIO()
+        if line_format is None:
+            _write_lines(out, columns, lines)
+        out.write(f'{count} rows\n')
+        stream.write(out.getvalue())
+        stream.flush()
+        return count
+
+    def _match(self, row):
+        for column, value in self.filters:
+            if _cell(row.get(column)).lower() != value:
+                return False
+        return True
+
+    def _rows(self):
+        if not self.filters:
+            return self.rows
+        return (row for row in self.rows if self._match(row))
+
+    def __init__(self, columns, rows=None, visible=None):
+        '''
+        visible are the columns shown by default, all of them if None
+        '''
+        self.columns = list(columns)
+        self.visible = list(visible or columns)
+        self.rows = []
+        self.filters = []
+        self.sort_key = None
+        self.sort_reverse = False
+        if rows is not None:
+            self.extend(rows)
+        super().__init__()
+
+
+def _write_lines(out, columns, lines):
+    '''
+    Writes header, separator and lines with columns fitting their content.
+    Returns the line format
+    '''
+    widths = [len(c) for c in columns]
+    for cells in lines:
+        for i, cell in enumerate(cells):
+            if len(cell) > widths[i]:
+                widths[i] = len(cell)
+    line_format = '  '.join('{:<%d}' % w for w in widths) + '\n'
+    out.write(line_format.format(*columns))
+    out.write(line_format.format(*['-' * w for w in widths]))
+    for cells in lines:
+        out.write(line_format.format(*cells))
+    return line_format
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    return str(value)
+
+
+def _sort_value(value):
+    '''
+    Numbers sort before strings, numerically
+    '''
+    try:
+        return (0, float(value), '')
+    except (TypeError, ValueError):
+        return (1, 0, _cell(value).lower())
@@ -1,17 +1,172 @@
+# String booleans used by the OLT
+_BOOLS = {'true': True, 'false': False}
+
+
 def pythonize(json):
     '''
     Helper function to process JSON structures with invalid Python data types
     Replaces - to _
     Replaces true/false to proper bools
+    Only the first level is processed, see to_python for nested blocks
     '''
-    # Replace - for _
-    cleaned_data = {}
-    for key, value in json.items():
-        cleaned_data[key.replace('-', '_')] = value
-    # Replace 'bool' values
-    for key, value in cleaned_data.items():
-        if value == 'true':
-            cleaned_data[key] = True
-        if value == 'false':
-            cleaned_data[key] = False
-    return cleaned_data
+    return {key.replace('-', '_'): _BOOLS.get(value, value) if type(value) is str else value
+            for key, value in json.items()}
+
+
+# Known OLT payload shapes: wire key -> shape of its value, None for plain values
+# '*' matches any key, used for blocks keyed by serial, profile id or port number
+SCHEMAS = {
+    'onu-list': {'*': 'onu'},
+    'onu': {
+        'disable': None, 'profile': None, 'name': None, 'wifi': 'wifi',
+        'pppoe-mode': None, 'pppoe-user': None, 'pppoe-password': None,
+        'wan-address': None, 'port-forwards': None, 'lastOnuId': None,
+    },
+    'wifi': {
+        'provisioned': None, 'enabled': None, 'channel': None,
+        'channel_width': None, 'tx_power': None, 'hide_ssid': None,
+        'auth_mode': None, 'encrypt_type': None, 'ssid': None, 'wpapsk': None,
+    },
+    'onu-profiles': {'*': 'profile'},
+    'profile': {
+        'name': None, 'mode': None, 'admin-password': None,
+        'lan-provisioned': None, 'lan-address': None, 'services': 'services',
+        'port': 'ports', 'bandwidth-limit-enabled': None,
+        'bandwidth-limit-down': None, 'bandwidth-limit-up': None,
+        'router-mode': 'router-mode', 'bridge-mode': 'bridge-mode',
+    },
+    'services': {
+        'http-port': None, 'ssh-enabled': None, 'ssh-port': None,
+        'telnet-enabled': None, 'telnet-port': None,
+        'ubnt-discovery-enabled': None,
+    },
+    'ports': {'*': 'port'},
+    'port': {'link-speed': None},
+    'router-mode': {
+        'wan-vlan': None, 'wan-mode': None, 'gateway': None,
+        'nat-protocol-ftp': None, 'nat-protocol-pptp': None,
+        'nat-protocol-rtsp': None, 'nat-protocol-sip': None,
+        'wan-access-blocked': None, 'upnp-enabled': None,
+        'dns-resolver': None, 'dns-proxy-enable': None,
+        'dhcp-server': None, 'dhcp-pool': None, 'dhcp-lease-time': None,
+        'dhcp-relay': None,
+    },
+    'bridge-mode': {'port': 'bridge-ports'},
+    'bridge-ports': {'*': 'bridge-port'},
+    'bridge-port': {'include-vlan': None, 'native-vlan': None},
+}
+
+# Compiled plans per shape: key -> (translated key, value shape)
+_PLANS = {}
+_WIRE_PLANS = {}
+
+
+def _plan(shape):
+    plan = _PLANS.get(shape)
+    if plan is None:
+        plan = {}
+        for key, value_shape in SCHEMAS[shape].items():
+            plan[key] = (key if key == '*' else key.replace('-', '_'), value_shape)
+        _PLANS[shape] = plan
+    return plan
+
+
+def _wire_plan(shape):
+    plan = _WIRE_PLANS.get(shape)
+    if plan is None:
+        plan = {}
+        for key, value_shape in SCHEMAS[shape].items():
+            plan[key if key == '*' else key.replace('-', '_')] = (key, value_shape)
+        _WIRE_PLANS[shape] = plan
+    return plan
+
+
+def to_python(data, shape=None):
+    '''
+    Converts an OLT payload in one recursive pass
+    Keys use _ instead of -, 'true'/'false' become bools
+    shape is a SCHEMAS name. Unknown keys are converted anyway
+    '''
+    plan = _plan(shape) if shape else {}
+    wildcard = plan.get('*')
+    result = {}
+    for key, value in data.items():
+        entry = plan.get(key)
+        if entry is None:
+            entry = (key, wildcard[1]) if wildcard else (key.replace('-', '_'), None)
+        value_type = type(value)
+        if value_type is str:
+            value = _BOOLS.get(value, value)
+        elif value_type is dict:
+            value = to_python(value, entry[1])
+        elif value_type is list:
+            value = [to_python(v, entry[1]) if type(v) is dict else v
+                     for v in value]
+        result[entry[0]] = value
+    return result
+
+
+def to_wire(data, shape=None):
+    '''
+    Reverse of to_python, back to OLT keys and 'true'/'false' strings
+    '''
+    plan = _wire_plan(shape) if shape else {}
+    wildcard = plan.get('*')
+    result = {}
+    for key, value in data.items():
+        entry = plan.get(key)
+        if entry is None:
+            entry = (key, wildcard[1]) if wildcard else (
+                key.replace('_', '-'), None)
+        if value is True:
+            value = 'true'
+        elif value is False:
+            value = 'false'
+        elif type(value) is dict:
+            value = to_wire(value, entry[1])
+        elif type(value) is list:
+            value = [to_wire(v, entry[1]) if type(v) is dict else v
+                     for v in value]
+        result[entry[0]] = value
+    return result
+
+
+# gpon_onu_list field names
+STATUS_PORT = 'olt_port'
+STATUS_ONLINE = 'online'
+STATUS_NAME = 'name'
+STATUS_PROFILE = 'profile'
+STATUS_OPTICS = 'optics'
+STATUS_STATS = 'stats'
+OPTICS_RX_POWER = 'rx_power'
+OPTICS_TX_POWER = 'tx_power'
+STATS_RX_BYTES = 'rx_bytes'
+STATS_TX_BYTES = 'tx_bytes'
+
+
+def normalize_serial(serial_number):
+    '''
+    Proper case for serial numbers, UBNT prefix upper, rest lower
+    '''
+    serial_number = str(serial_number).strip()
+    return serial_number[:4].upper() + serial_number[4:].lower()
+
+
+def onu_online(status):
+    '''
+    Returns True/False for an ONU status entry from gpon_onu_list
+    '''
+    online = status.get(STATUS_ONLINE, False)
+    if isinstance(online, str):
+        return online.lower() in ('true', 'online', 'up', '1')
+    return bool(online)
+
+
+def to_number(value):
+    '''
+    float() for status values, None if not a number
+    '''
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None